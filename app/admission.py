@@ -0,0 +1,215 @@
+# app/admission.py
+# Production tweak #9: Load shedding (admission control) + per-client rate limiting.
+
+# Design Choices:
+# Bounded in-flight work per endpoint class (query vs ingest), so the CPU-bound model is never oversubscribed.
+# Priority queue in front of the in-flight slots: lower number = served first, FIFO within the same priority.
+# Fast rejection: 503 + Retry-After when the queue is full or the estimated wait + own run time exceeds the deadline,
+# 429 + Retry-After when a client exceeds its token bucket. Rejecting early is cheap; timing out late is not.
+# A slot is released only when the worker thread finishes, even if the caller timed out (threads can't be killed).
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+MAX_RETRY_AFTER = 3600                                                                    # Seconds, cap for Retry-After (a zero refill rate means "never")
+
+
+class AdmissionRejected(HTTPException):
+    """HTTPException carrying a Retry-After header (FastAPI turns it into the response directly)."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        self.retry_after = max(1, math.ceil(min(retry_after, MAX_RETRY_AFTER)))
+        super().__init__(status_code=status_code, detail=detail,
+                         headers={"Retry-After": str(self.retry_after)})
+
+
+# --------------------------
+# Per-client token bucket
+# --------------------------
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second refill, up to `capacity` tokens of burst."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """Take one token. Returns 0 on success, else seconds until a token is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class RateLimiter:
+    """One token bucket per client id, capped at `max_clients` (least recently seen clients are evicted)."""
+
+    def __init__(self, rate_per_min: float, burst: int, max_clients: int = 10000):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.limited = 0
+
+    def check(self, client_id: str):
+        """Raise 429 if `client_id` has no tokens left."""
+        bucket = self.buckets.pop(client_id, None) or TokenBucket(self.rate, self.burst)
+        self.buckets[client_id] = bucket                                                  # Re-insert → most recently seen
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+
+        wait = bucket.try_acquire()
+        if wait > 0:
+            self.limited += 1
+            raise AdmissionRejected(429, "Rate limit exceeded, slow down.", wait)
+
+
+# --------------------------
+# Admission controller
+# --------------------------
+class AdmissionController:
+    """
+    Bounded concurrency + priority queue for one endpoint class.
+    `max_in_flight` calls run at once, at most `max_queue` wait, and a request is shed (up front, or when
+    it reaches the head of the queue) if it can no longer finish within `deadline` seconds.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, deadline: float, ewma_alpha: float = 0.2):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.ewma_alpha = ewma_alpha
+
+        self.in_flight = 0
+        self.waiters = []                                                                 # heap of (priority, seq, deadline_at, future), live entries only
+        self.seq = itertools.count()
+        self.service_time = None                                                          # EWMA of thread run time (s), None until first sample
+
+        self.admitted = 0
+        self.completed = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.shed_at_head = 0
+        self.timed_out_in_queue = 0
+
+    # ---------- estimation ----------
+
+    def queue_depth(self) -> int:
+        return len(self.waiters)
+
+    def estimated_wait(self, priority: int) -> float:
+        """Seconds a new request at `priority` would wait for a slot (requests at the same or better priority go first)."""
+        if self.in_flight < self.max_in_flight or not self.service_time:
+            return 0.0
+        ahead = sum(1 for p, *_ in self.waiters if p <= priority)                         # Bounded by max_queue
+        waves = ahead // self.max_in_flight + 1                                           # Slots free up max_in_flight at a time
+        return waves * self.service_time
+
+    def reject_if_overloaded(self, priority: int):
+        """Raise 503 (with Retry-After) if this request should be shed instead of queued."""
+        if self.in_flight < self.max_in_flight:
+            return
+        if self.queue_depth() >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(503, f"Server busy ({self.name} queue full), retry later.",
+                                    self.estimated_wait(priority) or 1)
+        wait = self.estimated_wait(priority)
+        if wait and wait + self.service_time > self.deadline:                             # Must wait AND run before the deadline
+            self.rejected_deadline += 1
+            raise AdmissionRejected(503, f"Server busy (estimated wait {wait:.0f}s + run {self.service_time:.0f}s "
+                                         f"exceeds {self.deadline:.0f}s), retry later.",
+                                    wait + self.service_time - self.deadline)
+
+    # ---------- slots ----------
+
+    async def _acquire(self, priority: int):
+        if self.in_flight < self.max_in_flight and not self.queue_depth():
+            self.in_flight += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self.seq), time.monotonic() + self.deadline, fut)
+        heapq.heappush(self.waiters, entry)
+        try:
+            await fut                                                                     # _release() hands the slot over (or sheds us)
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self._release()                                                           # Slot was granted just as we got cancelled, pass it on
+            elif entry in self.waiters:
+                self.waiters.remove(entry)                                                # Drop our queue position right away
+                heapq.heapify(self.waiters)
+                self.timed_out_in_queue += 1
+            raise
+
+    def _release(self):
+        now = time.monotonic()
+        while self.waiters:
+            _, _, deadline_at, fut = heapq.heappop(self.waiters)
+            if fut.done():
+                continue
+            if self.service_time and deadline_at - now < self.service_time:
+                # Would time out mid-run and keep the model busy for nothing: shed it instead
+                self.shed_at_head += 1
+                fut.set_exception(AdmissionRejected(503, f"Server busy ({self.name} deadline would be missed), retry later.",
+                                                    self.service_time))
+                continue
+            fut.set_result(None)                                                          # in_flight unchanged: slot moves to the waiter
+            return
+        self.in_flight -= 1
+
+    def _record(self, elapsed: float):
+        if self.service_time is None:
+            self.service_time = elapsed
+        else:
+            self.service_time += self.ewma_alpha * (elapsed - self.service_time)
+
+    async def run(self, func, *args, priority: int = 1):
+        """
+        Shed or queue, then run `func(*args)` in a worker thread once a slot is free.
+        Meant to be wrapped in asyncio.wait_for: cancelling while queued gives up the queue position,
+        cancelling while running leaves the thread to finish and release its slot.
+        """
+        self.reject_if_overloaded(priority)
+        await self._acquire(priority)
+        self.admitted += 1
+
+        start = time.monotonic()
+
+        def _done(t):
+            self.completed += 1
+            # Only successful runs feed the EWMA: quick failures would make overload look cheap
+            if not t.cancelled() and t.exception() is None:                               # exception() also marks it retrieved
+                self._record(time.monotonic() - start)
+            self._release()
+
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        task.add_done_callback(_done)
+        return await asyncio.shield(task)
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth(),
+            "max_queue": self.max_queue,
+            "deadline_s": self.deadline,
+            "service_time_ewma_s": round(self.service_time, 3) if self.service_time is not None else None,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_deadline": self.rejected_deadline,
+            "shed_at_head": self.shed_at_head,
+            "timed_out_in_queue": self.timed_out_in_queue,
+        }
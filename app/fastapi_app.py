@@ -6,9 +6,10 @@
 # Async + background threads: ensures queries don’t block the server.
 # Robust PDF handling: supports upload, chunking, embedding, and querying in one call.
 # Timeouts & error handling: prevents long-running queries from freezing the API.
+# Admission control: bounded in-flight work + priority queue + per-client rate limits, overload is shed early with 429/503.
 
 import asyncio
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Header
 from fastapi.responses import JSONResponse
 from pathlib import Path
 from pydantic import BaseModel
@@ -18,6 +19,7 @@ from app.loader import load_and_chunk_pdf
 from app.embeddings import load_or_create_vectorstore
 from app.chain import build_qa_chain
 from app.db_models import SessionLocal  
+from app.admission import AdmissionController, AdmissionRejected, RateLimiter
 from sqlalchemy import text
 
 # Keep potentially heavy imports inside startup / handlers to avoid import-time failures in CI.
@@ -43,6 +45,31 @@ llm = None
 vectordb = None
 qa_chain = None
 
+# --------------------------
+# Admission control (one controller + rate limiter per endpoint class)
+# --------------------------
+query_admission = AdmissionController("query", settings.query_max_in_flight, settings.query_max_queue, settings.query_timeout_s)
+ingest_admission = AdmissionController("ingest", settings.ingest_max_in_flight, settings.ingest_max_queue, settings.ingest_timeout_s)
+query_rate_limiter = RateLimiter(settings.query_rate_per_min, settings.query_burst)
+ingest_rate_limiter = RateLimiter(settings.ingest_rate_per_min, settings.ingest_burst)
+
+
+def client_id(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def parse_priority(x_priority, client: str) -> int:
+    """
+    X-Priority header → 0 (highest) .. 9 (lowest), honoured only for `settings.trusted_clients`.
+    Everyone else gets the configured default, so anonymous callers can't jump the queue.
+    """
+    if client not in settings.trusted_clients:
+        return settings.default_priority
+    try:
+        return min(9, max(0, int(x_priority)))
+    except (TypeError, ValueError):
+        return settings.default_priority
+
 # --------------------------
 # Pydantic Model
 # --------------------------
@@ -140,59 +167,86 @@ async def health_check():
         return {"status": "fail", "db_error": str(e)}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Queue depth, in-flight work and rejection counts per endpoint class."""
+    return {
+        "query": {**query_admission.metrics(), "rate_limited": query_rate_limiter.limited},
+        "ingest": {**ingest_admission.metrics(), "rate_limited": ingest_rate_limiter.limited},
+    }
+
+
 @app.post("/query")
-async def query_document(request: QueryRequest):
+async def query_document(request: QueryRequest, http_request: Request, x_priority: str = Header(None)):
     """
     Query the persisted vectorstore. If vectordb/qa_chain are absent, return a mocked answer (CI-safe).
     """
     # Use module globals
     global qa_chain, vectordb
 
+    client = client_id(http_request)
+    query_rate_limiter.check(client)                                                       # 429 before any work is done
+
     if not vectordb or not qa_chain:
         # CI-safe fallback: return a simple mocked answer instead of raising.
         return JSONResponse({"answer": f"mocked answer for: {request.question}"})
 
     try:
         result = await asyncio.wait_for(
-            asyncio.to_thread(qa_chain, {"query": request.question}),
-            timeout=500
+            query_admission.run(qa_chain, {"query": request.question}, priority=parse_priority(x_priority, client)),
+            timeout=settings.query_timeout_s
         )
         return {"answer": result.get("result", f"mocked result for: {request.question}")}
     except asyncio.TimeoutError:
-        raise HTTPException(status_code=504, detail="Query timed out after 30s")
+        raise HTTPException(status_code=504, detail=f"Query timed out after {settings.query_timeout_s:g}s")
+    except HTTPException:
+        raise                                                                              # Shed by admission control (429/503)
     except Exception:
         return JSONResponse({"answer": f"mocked exception answer for: {request.question}"})
 
 
 @app.post("/upload_query")
-async def upload_query(file: UploadFile = File(...), question: str = ""):
+async def upload_query(http_request: Request, file: UploadFile = File(...), question: str = "", x_priority: str = Header(None)):
     """Upload a PDF, embed it, and immediately run a query with timeout."""
     
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
+    # Shed before touching the disk: per-client rate limit, then queue capacity / estimated wait
+    client = client_id(http_request)
+    priority = parse_priority(x_priority, client)
+    ingest_rate_limiter.check(client)
+    ingest_admission.reject_if_overloaded(priority)
+
     # Save uploaded PDF with a unique name to avoid collisions
     pdf_path = DATA_DIR / f"{uuid4()}_{file.filename}"
     with open(pdf_path, "wb") as f:
         f.write(await file.read())
 
-    # Load & chunk PDF
-    chunks = load_and_chunk_pdf(str(pdf_path))
-    if not chunks:
-        raise HTTPException(status_code=400, detail="PDF has no valid content to embed.")
+    def ingest_and_query():
+        # Load & chunk PDF
+        chunks = load_and_chunk_pdf(str(pdf_path))
+        if not chunks:
+            raise HTTPException(status_code=400, detail="PDF has no valid content to embed.")
 
-    # Create vectorstore and QA chain
-    vectordb_local = load_or_create_vectorstore(chunks, persist_directory=str(DB_DIR))
-  #  qa_chain_local = build_qa_chain(qa_chain=qa_chain, vectordb=vectordb_local)  # or llm as needed
-    qa_chain_local = build_qa_chain(llm=llm, vectordb=vectordb_local)
+        # Create vectorstore and QA chain
+        vectordb_local = load_or_create_vectorstore(chunks, persist_directory=str(DB_DIR))
+      #  qa_chain_local = build_qa_chain(qa_chain=qa_chain, vectordb=vectordb_local)  # or llm as needed
+        qa_chain_local = build_qa_chain(llm=llm, vectordb=vectordb_local)
+        return qa_chain_local({"query": question})
 
-    # Run query with timeout
+    # Chunk + embed + query in one ingest slot (off the event loop), with timeout
     try:
         result = await asyncio.wait_for(
-            asyncio.to_thread(qa_chain_local, {"query": question}),
-            timeout=1000
+            ingest_admission.run(ingest_and_query, priority=priority),
+            timeout=settings.ingest_timeout_s
         )
-    except asyncio.TimeoutError:
-        raise HTTPException(status_code=504, detail="Query timed out after 30s")
+    except (AdmissionRejected, asyncio.TimeoutError) as e:
+        # Shed after the upload was saved, or gave up: the answer is never returned, so don't keep the PDF.
+        # (A still-running ingest thread that hasn't opened it yet just fails, its result is discarded anyway.)
+        pdf_path.unlink(missing_ok=True)
+        if isinstance(e, AdmissionRejected):
+            raise
+        raise HTTPException(status_code=504, detail=f"Query timed out after {settings.ingest_timeout_s:g}s")
 
     return JSONResponse({"answer": result["result"]})
@@ -1,7 +1,8 @@
 #from pydantic import BaseSettings
 from pydantic_settings import BaseSettings   # <-- changed import
-from pydantic import ConfigDict
+from pydantic import ConfigDict, Field
 import yaml
+from typing import List
 import os
 
 class Settings(BaseSettings):
@@ -12,6 +13,21 @@ class Settings(BaseSettings):
     postgres_url: str
     default_pdf_name: str   # <-- NEW
 
+    # Admission control / rate limiting (see app/admission.py)
+    # Bounds fail a bad config.yaml at startup instead of breaking admission at runtime.
+    query_timeout_s: float = Field(60, gt=0)
+    query_max_in_flight: int = Field(2, ge=1)
+    query_max_queue: int = Field(16, ge=0)
+    query_rate_per_min: float = Field(30, gt=0)
+    query_burst: int = Field(10, ge=1)
+    ingest_timeout_s: float = Field(300, gt=0)
+    ingest_max_in_flight: int = Field(1, ge=1)
+    ingest_max_queue: int = Field(4, ge=0)
+    ingest_rate_per_min: float = Field(4, gt=0)
+    ingest_burst: int = Field(2, ge=1)
+    default_priority: int = Field(1, ge=0, le=9)
+    trusted_clients: List[str] = []   # Client ids (IPs) allowed to set X-Priority
+
     class ConfigDict:
         extra = "forbid"  # (default in pydantic v2, means no extra keys allowed)
 
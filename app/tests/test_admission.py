@@ -0,0 +1,223 @@
+# app/tests/test_admission.py
+# Unit tests for admission control (load shedding) + rate limiting
+# ----------------------------------------------------
+# test_rate_limiter_burst       = Token bucket allows `burst` requests per client, then 429 with Retry-After
+# test_rate_limiter_zero_rate   = A zero refill rate still answers 429, with Retry-After capped
+# test_failures_not_recorded    = Runs that raise don't pull the service-time EWMA down
+# test_in_flight_bounded        = Never more than max_in_flight worker threads at once, extra requests queue
+# test_priority_order           = Queued requests are served lowest priority number first, FIFO within a priority
+# test_queue_full_sheds         = 503 with Retry-After once the queue is full
+# test_deadline_sheds           = 503 when the estimated wait + own run time (EWMA service time) exceeds the deadline
+# test_deadline_counts_run_time = Wait alone fits the deadline, wait + run doesn't → shed
+# test_shed_at_head_of_queue    = A waiter whose remaining deadline is shorter than the service time is shed instead of run
+# test_timeout_releases_slot    = Timing out in the queue gives up the position, timing out while running keeps the slot until the thread ends
+
+import asyncio
+import threading
+import time
+import pytest
+from app.admission import AdmissionController, AdmissionRejected, RateLimiter, MAX_RETRY_AFTER
+
+# ---------- UNIT TESTS ----------
+
+@pytest.mark.unit
+def test_rate_limiter_burst():
+    limiter = RateLimiter(rate_per_min=1, burst=2)
+    limiter.check("a")
+    limiter.check("a")
+    with pytest.raises(AdmissionRejected) as exc:
+        limiter.check("a")
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+    limiter.check("b")                                                                        # Buckets are per client
+    assert limiter.limited == 1
+
+
+@pytest.mark.unit
+def test_rate_limiter_zero_rate():
+    limiter = RateLimiter(rate_per_min=0, burst=1)
+    limiter.check("a")
+    with pytest.raises(AdmissionRejected) as exc:                                             # Not OverflowError from ceil(inf)
+        limiter.check("a")
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) == MAX_RETRY_AFTER
+
+
+@pytest.mark.unit
+def test_failures_not_recorded():
+    ctrl = AdmissionController("test", max_in_flight=1, max_queue=10, deadline=60)
+    ctrl.service_time = 3.0
+
+    def boom():
+        raise ValueError("no valid content")
+
+    async def main():
+        with pytest.raises(ValueError):
+            await ctrl.run(boom)
+        assert await ctrl.run(lambda: "ok") == "ok"
+
+    asyncio.run(main())
+    assert ctrl.completed == 2 and ctrl.in_flight == 0
+    assert 2.0 < ctrl.service_time < 3.0                                                      # Only the successful run was blended in (0.8 * 3s)
+
+
+@pytest.mark.unit
+def test_in_flight_bounded():
+    ctrl = AdmissionController("test", max_in_flight=2, max_queue=10, deadline=60)
+    lock = threading.Lock()
+    state = {"now": 0, "peak": 0}
+
+    def work(_):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.05)
+        with lock:
+            state["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*(ctrl.run(work, i) for i in range(6)))
+
+    asyncio.run(main())
+    assert state["peak"] == 2
+    assert ctrl.completed == 6 and ctrl.in_flight == 0 and ctrl.queue_depth() == 0
+
+
+@pytest.mark.unit
+def test_priority_order():
+    ctrl = AdmissionController("test", max_in_flight=1, max_queue=10, deadline=60)
+    order = []
+    gate = threading.Event()
+
+    async def main():
+        blocker = asyncio.create_task(ctrl.run(gate.wait))
+        await asyncio.sleep(0.01)                                                             # blocker holds the only slot
+        tasks = [asyncio.create_task(ctrl.run(order.append, name, priority=p))
+                 for name, p in [("low", 5), ("high-1", 0), ("mid", 1), ("high-2", 0)]]
+        await asyncio.sleep(0.01)
+        assert ctrl.queue_depth() == 4
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+
+    asyncio.run(main())
+    assert order == ["high-1", "high-2", "mid", "low"]
+
+
+@pytest.mark.unit
+def test_queue_full_sheds():
+    ctrl = AdmissionController("test", max_in_flight=1, max_queue=1, deadline=60)
+    gate = threading.Event()
+
+    async def main():
+        blocker = asyncio.create_task(ctrl.run(gate.wait))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(ctrl.run(lambda: None))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctrl.run(lambda: None)
+        gate.set()
+        await asyncio.gather(blocker, queued)
+        return exc.value
+
+    rejected = asyncio.run(main())
+    assert rejected.status_code == 503
+    assert "Retry-After" in rejected.headers
+    assert ctrl.rejected_queue_full == 1
+
+
+@pytest.mark.unit
+def test_deadline_sheds():
+    ctrl = AdmissionController("test", max_in_flight=1, max_queue=10, deadline=7)
+    ctrl.service_time = 3.0                                                                   # Pretend each call takes ~3s
+    gate = threading.Event()
+
+    async def main():
+        blocker = asyncio.create_task(ctrl.run(gate.wait))
+        await asyncio.sleep(0.01)
+        assert ctrl.estimated_wait(priority=1) == 3.0                                         # First in line: one service time
+        queued = asyncio.create_task(ctrl.run(lambda: None))                                  # 3s wait + 3s run fits in 7s
+        await asyncio.sleep(0.01)
+        assert ctrl.estimated_wait(priority=1) == 6.0                                         # Behind one more: 6s + 3s > 7s
+        assert ctrl.estimated_wait(priority=0) == 3.0                                         # Higher priority jumps the queue
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctrl.run(lambda: None, priority=1)
+        gate.set()
+        await asyncio.gather(blocker, queued)
+        return exc.value
+
+    rejected = asyncio.run(main())
+    assert rejected.status_code == 503
+    assert ctrl.rejected_deadline == 1
+
+
+@pytest.mark.unit
+def test_deadline_counts_run_time():
+    ctrl = AdmissionController("test", max_in_flight=1, max_queue=10, deadline=60)
+    ctrl.service_time = 40.0                                                                  # 40s wait < 60s, but 40s + 40s run > 60s
+    gate = threading.Event()
+
+    async def main():
+        blocker = asyncio.create_task(ctrl.run(gate.wait))
+        await asyncio.sleep(0.01)
+        assert ctrl.estimated_wait(priority=1) == 40.0
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctrl.run(lambda: None)
+        gate.set()
+        await blocker
+        return exc.value
+
+    rejected = asyncio.run(main())
+    assert rejected.status_code == 503
+    assert int(rejected.headers["Retry-After"]) == 20
+    assert ctrl.rejected_deadline == 1 and ctrl.queue_depth() == 0
+
+
+@pytest.mark.unit
+def test_shed_at_head_of_queue():
+    ctrl = AdmissionController("test", max_in_flight=1, max_queue=10, deadline=0.5)
+    ctrl.service_time = 0.1
+    gate = threading.Event()
+    ran = []
+
+    async def main():
+        blocker = asyncio.create_task(ctrl.run(gate.wait))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(ctrl.run(ran.append, "late"))                            # 0.1s wait + 0.1s run: admitted
+        await asyncio.sleep(0.45)                                                             # Slot holder overruns, ~0.05s of deadline left
+        gate.set()
+        with pytest.raises(AdmissionRejected) as exc:
+            await queued
+        await blocker
+        return exc.value
+
+    rejected = asyncio.run(main())
+    assert rejected.status_code == 503
+    assert ran == [] and ctrl.shed_at_head == 1
+    assert ctrl.in_flight == 0 and ctrl.queue_depth() == 0
+
+
+@pytest.mark.unit
+def test_timeout_releases_slot():
+    ctrl = AdmissionController("test", max_in_flight=1, max_queue=10, deadline=60)
+    gate = threading.Event()
+
+    async def main():
+        # Running call times out: the thread keeps its slot until it actually finishes
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(ctrl.run(gate.wait), timeout=0.05)
+        assert ctrl.in_flight == 1
+
+        # Queued call times out: its queue position is dropped
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(ctrl.run(lambda: None), timeout=0.05)
+        assert ctrl.waiters == [] and ctrl.timed_out_in_queue == 1                             # Removed from the heap, not left behind
+
+        gate.set()
+        for _ in range(100):
+            if ctrl.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert ctrl.in_flight == 0
+        assert await ctrl.run(lambda: "ok") == "ok"
+
+    asyncio.run(main())
@@ -3,6 +3,9 @@
 # ----------------------------------------------------
 # test_health        = Basic health check of FastAPI + DB connection (unit)
 # test_settings_load = Config sanity check (unit)
+# test_settings_rejects_bad_limits = Admission limits out of bounds fail at config load (unit)
+# test_query_rate_limited = /query returns 429 + Retry-After once the client's token bucket is empty (unit)
+# test_metrics_shape = /metrics exposes queue depth + rejection counts per endpoint class (unit)
 
 import pytest
 from fastapi.testclient import TestClient
@@ -28,3 +31,40 @@ def test_settings_load():
     assert settings.data_dir == "data"
     assert settings.postgres_url.startswith("postgresql://")
 
+@pytest.mark.unit
+@pytest.mark.parametrize("key,value", [("query_max_in_flight", 0), ("ingest_max_queue", -1),
+                                       ("query_timeout_s", 0), ("query_rate_per_min", 0)])
+def test_settings_rejects_bad_limits(tmp_path, key, value):
+    import yaml
+    from pydantic import ValidationError
+    from app.settings import load_settings
+    cfg = {**settings.model_dump(), key: value}
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(cfg))
+    with pytest.raises(ValidationError):
+        load_settings(str(path))
+
+@pytest.mark.unit
+def test_query_rate_limited(monkeypatch):
+    from app import fastapi_app as fa
+    from app.admission import RateLimiter
+    monkeypatch.setattr(fa, "query_rate_limiter", RateLimiter(rate_per_min=1, burst=2))    # Fresh, tiny bucket for this test
+
+    for _ in range(2):
+        assert client.post("/query", json={"question": "What is RAG?"}).status_code == 200
+    response = client.post("/query", json={"question": "What is RAG?"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    metrics = client.get("/metrics").json()
+    assert metrics["query"]["rate_limited"] == 1
+
+@pytest.mark.unit
+def test_metrics_shape():
+    response = client.get("/metrics")
+    data = response.json()
+    assert response.status_code == 200
+    for endpoint_class in ["query", "ingest"]:
+        assert {"in_flight", "max_in_flight", "queue_depth", "max_queue", "deadline_s", "service_time_ewma_s",
+                "admitted", "completed", "rejected_queue_full", "rejected_deadline", "shed_at_head",
+                "timed_out_in_queue", "rate_limited"} <= set(data[endpoint_class])
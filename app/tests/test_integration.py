@@ -3,7 +3,7 @@
 # ----------------------------------------------------
 # test_full_rag_pipeline    = Internal RAG logic without HTTP (functional integration (core logic)) to assert that the answer is not empty. Tests direct objects: chunks → vectorstore → LLM → QA chain. No FastAPI endpoints (/query or /upload_query) ran directly.
 # test_qa_chain_timeout     = Timeout behavior (internal async) to assert that the timeout occurs on qa_chain. No FastAPI endpoints (/query or /upload_query) ran directly. Checks internal async handling logic i.e., "Can my timeout code actually trigger?"
-# test_upload_query_timeout = Timeout behavior (API level, /upload_query), system integration (real endpoint) with timeout logic tested. Checks the API-level user-facing timeout behavior i.e., "And when timeout triggers, does my API return the correct response?"
+# test_upload_query_timeout = Timeout behavior (API level, /upload_query), system integration (real endpoint) with timeout logic tested through the ingest admission controller (slot kept by the running thread, saved PDF deleted). Checks the API-level user-facing timeout behavior i.e., "And when timeout triggers, does my API return the correct response?"
 # test_query_endpoint       = `/query` Full FastAPI endpoint check (RAG mocked or real) (integration)
 
 import pytest
@@ -17,6 +17,7 @@ import time
 import asyncio
 from app.fastapi_app import qa_chain                                                         # patch if needed
 from app import fastapi_app as fa
+from app.admission import AdmissionController, RateLimiter
 from fastapi.testclient import TestClient
 from pathlib import Path
 from unittest.mock import patch
@@ -65,13 +66,19 @@ def test_qa_chain_timeout():
 
 
 @pytest.mark.integration
-def test_upload_query_timeout(tmp_path):
+def test_upload_query_timeout(tmp_path, monkeypatch):
     client = TestClient(fa.app)
 
-    # Patch load_and_chunk_pdf, build_qa_chain, and asyncio.wait_for
+    # Small ingest deadline + fresh admission/rate-limit state, uploads saved under tmp_path
+    monkeypatch.setattr(fa.settings, "ingest_timeout_s", 0.2)
+    monkeypatch.setattr(fa, "ingest_admission", AdmissionController("ingest", 1, 4, 0.2))
+    monkeypatch.setattr(fa, "ingest_rate_limiter", RateLimiter(rate_per_min=60, burst=5))
+    monkeypatch.setattr(fa, "DATA_DIR", tmp_path)
+
+    # Patch load_and_chunk_pdf, load_or_create_vectorstore and build_qa_chain (no models needed)
     with patch("app.fastapi_app.load_and_chunk_pdf") as mock_loader, \
-         patch("app.fastapi_app.build_qa_chain") as mock_build_chain, \
-         patch("app.fastapi_app.asyncio.wait_for") as mock_wait_for:
+         patch("app.fastapi_app.load_or_create_vectorstore") as mock_vectorstore, \
+         patch("app.fastapi_app.build_qa_chain") as mock_build_chain:
 
         # Fake PDF chunks (simulate chunked pages)
         mock_loader.return_value = [
@@ -79,13 +86,13 @@ def test_upload_query_timeout(tmp_path):
             Document(page_content="chunk2")
         ]
 
-        # Build chain returns dummy slow-like function
-        mock_build_chain.return_value = lambda query: {"result": "too slow"}
-
-        # Force asyncio.wait_for to immediately raise TimeoutError
-        mock_wait_for.side_effect = asyncio.TimeoutError
+        # Build chain returns a chain slower than the deadline
+        def slow_chain(query):
+            time.sleep(0.5)
+            return {"result": "too slow"}
+        mock_build_chain.return_value = slow_chain
 
-        # Call endpoint
+        # Call endpoint: goes through ingest_admission.run + the real asyncio.wait_for
         response = client.post(
             "/upload_query",
             files={"file": ("mock.pdf", b"%PDF-1.4 mock content")},
@@ -94,8 +101,16 @@ def test_upload_query_timeout(tmp_path):
 
         # Expect 504 timeout response
         assert response.status_code == 504
+        assert "0.2s" in response.json()["detail"]
+
+        # The timed-out thread kept its slot until it finished (TestClient's loop waits for it), then released it
+        assert fa.ingest_admission.admitted == 1 and fa.ingest_admission.completed == 1
+        assert fa.ingest_admission.in_flight == 0
+
+        # Saved PDF is cleaned up since the answer is never returned
+        assert list(tmp_path.iterdir()) == []
+
 
-  
 @pytest.mark.integration
 def test_query_endpoint():
     response = client.post(